@@ -1,13 +1,23 @@
 """Functions for validation and generation of Norwegian fødselsnumbers"""
 
 import re
-from datetime import date, datetime
-from typing import Callable, Literal, Optional
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, Literal, Optional, Tuple
 
 from dateutil.relativedelta import relativedelta
 
 FNR_REGEX = re.compile(r'\d{11}')
 
+# The control digit for each possible rest of the weighted sum modulo 11 (10 means no valid digit)
+_CONTROL_DIGIT_FOR_REST = (0, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1)
+
+# Every individual number 000-999, with its share of the two control digit sums
+_INDIVIDUAL_NUMBERS = tuple(
+    (f'{x:03d}', 4 * (x // 100) + 5 * (x // 10 % 10) + 2 * (x % 10), 5 * (x // 100) + 4 * (x // 10 % 10) + 3 * (x % 10))
+    for x in range(1000)
+)
+
 
 class FodselsnummerException(Exception):
     pass
@@ -17,94 +27,169 @@ class InvalidControlDigitException(FodselsnummerException):
     pass
 
 
-def validate_fnr(fnr: str, d_numbers=True, h_numbers=False) -> Literal[True]:
+def validate_fnr(fnr: str, d_numbers=True, h_numbers=False, today: Optional[date] = None) -> Literal[True]:
+    """
+    Check if a number is a valid fødselsnumber.
+    Args:
+        fnr: A string containing the fodselsnummer to check
+        h_numbers: False (the default) if h-numbers should be accepted
+        d_numbers: True (the default) if d-numbers should be accepted
+        today: The current date, birth dates after it are rejected (defaults to date.today())
+    Returns:
+        True if it is a valid fodselsnummer, raises ValueError otherwise.
+    """
+    error = _validate_fnr(fnr, d_numbers, h_numbers, today or date.today())
+    if error is not None:
+        raise ValueError(error)
+    return True
+
+
+def check_fnr(fnr: str, d_numbers=True, h_numbers=False, logger: Callable = lambda _x: None,
+              today: Optional[date] = None) -> bool:
     """
     Check if a number is a valid fødselsnumber.
     Args:
         fnr: A string containing the fodselsnummer to check
         h_numbers: False (the default) if h-numbers should be accepted
         d_numbers: True (the default) if d-numbers should be accepted
+        logger: A function used to log things
+        today: The current date, birth dates after it are rejected (defaults to date.today())
     Returns:
         True if it is a valid fodselsnummer, False otherwise.
     """
-    if not FNR_REGEX.match(fnr):
-        raise ValueError('Fødselsnumber does not match regex \\d{11}')
+    error = _validate_fnr(fnr, d_numbers, h_numbers, today or date.today())
+    if error is not None:
+        logger(error)
+        return False
+    return True
 
-    individual_number = int(fnr[6:9])
-    day, month, year = int(fnr[0:2]), int(fnr[2:4]), int(fnr[4:6])
+
+def check_fnrs(fnrs: Iterable[str], d_numbers=True, h_numbers=False, today: Optional[date] = None) -> List[bool]:
+    """
+    Check if each of a batch of numbers is a valid fødselsnumber.
+    Args:
+        fnrs: The fodselsnummers to check
+        h_numbers: False (the default) if h-numbers should be accepted
+        d_numbers: True (the default) if d-numbers should be accepted
+        today: The current date, birth dates after it are rejected (defaults to date.today())
+    Returns:
+        A list with True for each valid fodselsnummer and False for the others, in the same order.
+    """
+    if today is None:
+        today = date.today()
+    # Most invalid numbers fail on the control digits, so check those before the full validation
+    return [_has_valid_control_digits(fnr) and _validate_fnr(fnr, d_numbers, h_numbers, today) is None for fnr in fnrs]
+
+
+def _has_valid_control_digits(fnr: str) -> bool:
+    """Checks that a number is 11 digits ending in the correct control digits"""
+    if len(fnr) != 11 or not (fnr.isascii() and fnr.isdigit()):
+        return False
+    b = fnr.encode('ascii')
+    return _control_digits(b) == (b[9] - 48, b[10] - 48)
+
+
+@lru_cache(maxsize=65536)
+def _validate_fnr(fnr: str, d_numbers: bool, h_numbers: bool, today: date) -> Optional[str]:
+    """
+    Validates a fødselsnumber.
+    The result only depends on the arguments, so it is cached for repeated validations.
+    Returns:
+        None if it is a valid fodselsnummer, otherwise a message describing why it is not.
+    """
+    if len(fnr) != 11 or not (fnr.isascii() and fnr.isdigit()):
+        return 'Fødselsnumber does not match regex \\d{11}'
+
+    b = fnr.encode('ascii')
+    day = (b[0] - 48) * 10 + b[1] - 48
+    month = (b[2] - 48) * 10 + b[3] - 48
+    year = (b[4] - 48) * 10 + b[5] - 48
+    individual_number = (b[6] - 48) * 100 + (b[7] - 48) * 10 + b[8] - 48
     if 41 <= day <= 71:  # if D-number
         if not d_numbers:
-            raise ValueError('Fødselsnumber is a D-number (or day out of range)')
+            return 'Fødselsnumber is a D-number (or day out of range)'
         day -= 40
 
     if not (1 <= day <= 31):
-        raise ValueError('Day out of range in fødselsnumber')
+        return 'Day out of range in fødselsnumber'
     if 41 <= month <= 52:  # if H-number
         if h_numbers:
             month -= 40
         else:
-            raise ValueError('Fødselsnumber is a H-number (or month out of range)')
+            return 'Fødselsnumber is a H-number (or month out of range)'
     if not 1 <= month <= 12:
-        raise ValueError('Month out of range in fødselsnumber')
-    if individual_number <= 499:  # individual numbers 000-499 indicate person is born in 19XX
-        year += 1900
-    else:
-        year += 2000
-    if individual_number >= 900 and year >= 2040:
-        year -= 100
-    dob: Optional[date] = None
+        return 'Month out of range in fødselsnumber'
+    year = _birth_year(year, individual_number)
     try:
         dob = date(year=year, month=month, day=day)
-        if dob > date.today():
-            raise ValueError('Date of fødselsnumber is larger than current date')
     except ValueError:
-        raise ValueError(f'{year}-{month}-{day} is not a valid date')
+        return f'{year}-{month}-{day} is not a valid date'
+    if dob > today:
+        return f'{year}-{month}-{day} is not a valid date'
 
-    try:
-        generatedfnr = _generate_control_digits(fnr[0:9])
-    except InvalidControlDigitException:
-        raise ValueError('Control digit does not match fødselsnumber')
+    controls = _control_digits(b)
+    if controls is None or controls != (b[9] - 48, b[10] - 48):
+        return 'Control digit does not match fødselsnumber'
+    return None
 
-    if not bool(fnr == generatedfnr):
-        raise ValueError('Control digit does not match fødselsnumber')
-    return True
 
+def generate_fnr_for_year(year, d_numbers):
+    """
+    Generates all the possible fødselsnumbers for a year.
 
-def check_fnr(fnr: str, d_numbers=True, h_numbers=False, logger: Callable = lambda _x: None) -> bool:
+    Args:
+        year: The year to generate fodselsnummers for (integer)
+        d_numbers: True if you want d-numbers as well, False otherwise.
+    Returns:
+        A list with all the possible fodselsnummers for that year.
     """
-    Check if a number is a valid fødselsnumber.
+    allfnrs = []
+    for thisdaysfnr in _generate_fnr_for_days_of_year(year, d_numbers):
+        allfnrs.extend(thisdaysfnr)
+    return allfnrs
+
+
+def iter_fnr_for_year(year, d_numbers) -> Iterator[str]:
+    """
+    Generates all the possible fødselsnumbers for a year, one at a time.
+
     Args:
-        fnr: A string containing the fodselsnummer to check
-        h_numbers: False (the default) if h-numbers should be accepted
-        d_numbers: True (the default) if d-numbers should be accepted
-        logger: A function used to log things
+        year: The year to generate fodselsnummers for (integer)
+        d_numbers: True if you want d-numbers as well, False otherwise.
     Returns:
-        True if it is a valid fodselsnummer, False otherwise.
+        An iterator over the same fodselsnummers as generate_fnr_for_year,
+        only keeping one day's fodselsnummers in memory at a time.
     """
-    try:
-        return validate_fnr(fnr=fnr, d_numbers=d_numbers, h_numbers=h_numbers)
-    except ValueError as e:
-        logger(str(e))
-        return False
+    for thisdaysfnr in _generate_fnr_for_days_of_year(year, d_numbers):
+        yield from thisdaysfnr
 
 
-def generate_fnr_for_year(year, d_numbers):
+def generate_fnr_for_year_bytes(year, d_numbers) -> bytes:
     """
-    Generates all the possible fødselsnumbers for a year.
+    Generates all the possible fødselsnumbers for a year, packed into a single bytes object.
 
     Args:
         year: The year to generate fodselsnummers for (integer)
         d_numbers: True if you want d-numbers as well, False otherwise.
     Returns:
-        A list with all the possible fodselsnummers for that year.
+        The ASCII fodselsnummers in the same order as generate_fnr_for_year,
+        without separators, so fodselsnummer n is at [11 * n:11 * n + 11].
     """
-    allfnrs = []
+    allfnrs = bytearray()
+    for thisdaysfnr in _generate_fnr_for_days_of_year(year, d_numbers):
+        allfnrs += ''.join(thisdaysfnr).encode('ascii')
+    return bytes(allfnrs)
+
+
+def _generate_fnr_for_days_of_year(year, d_numbers):
+    """Yields a list with the possible fødselsnumbers for each day of a year"""
+    individualnumbers = _individual_numbers(year)
+    generate = _generate_fnr_for_day_with_d if d_numbers else _generate_fnr_for_day_no_d
     startdate = date(year, 1, 1)
     enddate = date(year, 12, 31)
     delta = enddate - startdate
     for i in range(delta.days + 1):
-        allfnrs += generate_fnr_for_day(startdate + td(days=i), d_numbers)
-    return allfnrs
+        yield generate(startdate + timedelta(days=i), individualnumbers)
 
 
 def generate_fnr_for_day(day, d_numbers):
@@ -117,159 +202,151 @@ def generate_fnr_for_day(day, d_numbers):
     Returns:
         A list with all the possible fodselsnummers for that day.
     """
-    thisdaysfnr = []
-    stupid1900s = False
-    datestring = day.strftime('%d%m%y')
-    if d_numbers:
-        dnrdatestring = str(int(datestring[0]) + 4) + datestring[1:]
+    generate = _generate_fnr_for_day_with_d if d_numbers else _generate_fnr_for_day_no_d
+    return generate(day, _individual_numbers(day.year))
+
+
+def _individual_numbers(year):
+    """Returns the entries of _INDIVIDUAL_NUMBERS that can be given to persons born in a year"""
     # ref:
     # http://www.kith.no/upload/5588/KITH1001-2010_Identifikatorer-for-personer_v1.pdf
     # Does not account for the 1800s, since this is for living persons
     # (this means that the 1800s list will be a little longer than necessary)
-    if 1900 <= day.year <= 1999:
-        individualmin = 000
-        individualmax = 499
-        if 1940 <= day.year <= 1999:
-            stupid1900s = True
+    if 1900 <= year <= 1999:
+        individualnumbers = _INDIVIDUAL_NUMBERS[0:500]
+        # Bonus round because of the stupid 1900s
+        if 1940 <= year <= 1999:
+            individualnumbers += _INDIVIDUAL_NUMBERS[900:1000]
     else:
-        individualmin = 500
-        individualmax = 999
-    for x in range(individualmin, individualmax + 1):
-        individualnr = str(x).zfill(3)
-        try:
-            thisdaysfnr.append(_generate_control_digits(datestring + individualnr))
-        except InvalidControlDigitException:
-            pass
-        if d_numbers:
-            try:
-                thisdaysfnr.append(_generate_control_digits(dnrdatestring + individualnr))
-            except InvalidControlDigitException:
-                pass
-    # Bonus round because of the stupid 1900s
-    if stupid1900s:
-        for x in range(900, 1000):
-            individualnr = str(x).zfill(3)
-            try:
-                thisdaysfnr.append(_generate_control_digits(datestring + individualnr))
-            except InvalidControlDigitException:
-                pass
-            if d_numbers:
-                try:
-                    thisdaysfnr.append(_generate_control_digits(dnrdatestring + individualnr))
-                except InvalidControlDigitException:
-                    pass
-    return thisdaysfnr
+        individualnumbers = _INDIVIDUAL_NUMBERS[500:1000]
+    return individualnumbers
 
 
-def _generate_control_digits(numbersofar):
-    """Generates the magic control digits in a fødselsnumber"""
-    staticnumbers1 = [3, 7, 6, 1, 8, 9, 4, 5, 2, 1]
-    staticnumbers2 = [5, 4, 3, 2, 7, 6, 5, 4, 3, 2, 1]
-    sum1 = 0
-    for x in range(0, 9):
-        sum1 += int(numbersofar[x]) * staticnumbers1[x]
-    rest = sum1 % 11
-    if rest == 0:
-        control1 = 0
-    else:
-        if 11 - rest != 10:
-            control1 = 11 - rest
-        else:
-            raise InvalidControlDigitException
-    numbersofar += str(control1)
-    sum2 = 0
-    for x in range(0, 10):
-        sum2 += int(numbersofar[x]) * staticnumbers2[x]
-    rest = sum2 % 11
-    if rest == 0:
-        control2 = 0
-    else:
-        if 11 - rest != 10:
-            control2 = 11 - rest
-        else:
-            raise InvalidControlDigitException
-    numbersofar += str(control2)
-    return numbersofar
+def _generate_fnr_for_day_no_d(day, individualnumbers):
+    """Generates the fødselsnumbers for a day with the given entries of _INDIVIDUAL_NUMBERS"""
+    thisdaysfnr = []
+    datestring = f'{day.day:02d}{day.month:02d}{day.year % 100:02d}'
+    sum1_base, sum2_base = _date_sums(datestring)
+    for individualnr, individual_sum1, individual_sum2 in individualnumbers:
+        control1 = _CONTROL_DIGIT_FOR_REST[(sum1_base + individual_sum1) % 11]
+        if control1 != 10:
+            control2 = _CONTROL_DIGIT_FOR_REST[(sum2_base + individual_sum2 + 2 * control1) % 11]
+            if control2 != 10:
+                thisdaysfnr.append(f'{datestring}{individualnr}{control1}{control2}')
+    return thisdaysfnr
 
-"""
-The national identity number consists of 11 digits.
-The first six digits represent the date of birth in the order day, month, year.
-The next three digits are an individual number, the third digit of which indicates gender
-– even numbers for women and odd numbers for men. The last two digits are control digits.
 
-Source: https://www.oecd.org/tax/automatic-exchange/crs-implementation-and-assistance/tax-identification-numbers/Norway-TIN.pdf
-"""
-def get_age(fnr: str) -> int:
-    validate_fnr(fnr=fnr, d_numbers=True, h_numbers=True)
+def _generate_fnr_for_day_with_d(day, individualnumbers):
+    """Like _generate_fnr_for_day_no_d, but with the d-number for each individual number following it"""
+    thisdaysfnr = []
+    datestring = f'{day.day:02d}{day.month:02d}{day.year % 100:02d}'
+    sum1_base, sum2_base = _date_sums(datestring)
+    dnrdatestring = f'{day.day + 40:02d}{day.month:02d}{day.year % 100:02d}'
+    dnr_sum1_base, dnr_sum2_base = _date_sums(dnrdatestring)
+    for individualnr, individual_sum1, individual_sum2 in individualnumbers:
+        control1 = _CONTROL_DIGIT_FOR_REST[(sum1_base + individual_sum1) % 11]
+        if control1 != 10:
+            control2 = _CONTROL_DIGIT_FOR_REST[(sum2_base + individual_sum2 + 2 * control1) % 11]
+            if control2 != 10:
+                thisdaysfnr.append(f'{datestring}{individualnr}{control1}{control2}')
+        control1 = _CONTROL_DIGIT_FOR_REST[(dnr_sum1_base + individual_sum1) % 11]
+        if control1 != 10:
+            control2 = _CONTROL_DIGIT_FOR_REST[(dnr_sum2_base + individual_sum2 + 2 * control1) % 11]
+            if control2 != 10:
+                thisdaysfnr.append(f'{dnrdatestring}{individualnr}{control1}{control2}')
+    return thisdaysfnr
 
-    day, month, year, individual_number = int(fnr[0:2]), int(fnr[2:4]), int(fnr[4:6]), int(fnr[6:9])
 
-    if 41 <= day <= 71:  # if D-number
-        day -= 40
-    if not (1 <= day <= 31):
-        raise ValueError('Day out of range in fødselsnumber')
+def _date_sums(datestring):
+    """Returns the parts of the two control digit sums contributed by the six date digits"""
+    b = datestring.encode('ascii')
+    d0, d1, d2, d3, d4, d5 = b[0] - 48, b[1] - 48, b[2] - 48, b[3] - 48, b[4] - 48, b[5] - 48
+    return (3 * d0 + 7 * d1 + 6 * d2 + 1 * d3 + 8 * d4 + 9 * d5,
+            5 * d0 + 4 * d1 + 3 * d2 + 2 * d3 + 7 * d4 + 6 * d5)
 
-    if 41 <= month <= 52:  # if H-number
-        month -= 40
-    if not 1 <= month <= 12:
-        raise ValueError('Month out of range in fødselsnumber')
 
+def _generate_control_digits(numbersofar) -> Optional[str]:
     """
-    born 1854-1899: allocated from series 749-500
-    born 1900-1999: allocated from series 499-000
-    born 1940-1999: also allocated from series 999-900
-    born 2000-2039: allocated from series 999-500
+    Generates the magic control digits in a fødselsnumber.
+    Returns None if there are no valid control digits for the number.
+    """
+    controls = _control_digits(numbersofar.encode('ascii'))
+    if controls is None:
+        return None
+    return f'{numbersofar}{controls[0]}{controls[1]}'
 
-    Source: https://www.oecd.org/tax/automatic-exchange/crs-implementation-and-assistance/tax-identification-numbers/Norway-TIN.pdf
+
+def _control_digits(b: bytes) -> Optional[Tuple[int, int]]:
     """
-    if individual_number <= 499:  # individual numbers 000-499 indicate person is born in 19XX
-        year += 1900
-    else:
-        year += 2000
-    if individual_number >= 900 and year >= 2040:
-        year -= 100
+    Calculates the two control digits from the first nine digits of a fødselsnumber in ASCII.
+    Returns None if there are no valid control digits for the number.
+    """
+    d0, d1, d2, d3, d4, d5, d6, d7, d8 = b[0] - 48, b[1] - 48, b[2] - 48, b[3] - 48, b[4] - 48, b[5] - 48, b[6] - 48, b[7] - 48, b[8] - 48
+    sum1 = 3 * d0 + 7 * d1 + 6 * d2 + 1 * d3 + 8 * d4 + 9 * d5 + 4 * d6 + 5 * d7 + 2 * d8
+    control1 = _CONTROL_DIGIT_FOR_REST[sum1 % 11]
+    if control1 == 10:
+        return None
+    sum2 = 5 * d0 + 4 * d1 + 3 * d2 + 2 * d3 + 7 * d4 + 6 * d5 + 5 * d6 + 4 * d7 + 3 * d8 + 2 * control1
+    control2 = _CONTROL_DIGIT_FOR_REST[sum2 % 11]
+    if control2 == 10:
+        return None
+    return control1, control2
 
-    birth_date = date(year, month, day)
-    now_date = datetime.now().date()
+"""
+The national identity number consists of 11 digits.
+The first six digits represent the date of birth in the order day, month, year.
+The next three digits are an individual number, the third digit of which indicates gender
+– even numbers for women and odd numbers for men. The last two digits are control digits.
+
+Source: https://www.oecd.org/tax/automatic-exchange/crs-implementation-and-assistance/tax-identification-numbers/Norway-TIN.pdf
+"""
+def get_age(fnr: str, today: Optional[date] = None) -> int:
+    if today is None:
+        today = date.today()
+    birth_date = get_date_of_birth(fnr=fnr, d_numbers=True, h_numbers=True, today=today)
 
-    return relativedelta(now_date, birth_date).years
+    return relativedelta(today, birth_date).years
 
 
-def get_date_of_birth(fnr: str, d_numbers=True, h_numbers=False) -> date:
+def get_date_of_birth(fnr: str, d_numbers=True, h_numbers=False, today: Optional[date] = None) -> date:
     """
     Extracts date of birth from a valid fødselsnumber.
     Args:
         fnr: fodselsnummer to check
         h_numbers: False (the default) if h-numbers should be accepted
         d_numbers: True (the default) if d-numbers should be accepted
+        today: The current date, birth dates after it are rejected (defaults to date.today())
     Returns:
         returns date of birth of type date
     """
 
-    validate_fnr(fnr=fnr, d_numbers=d_numbers, h_numbers=h_numbers)
+    validate_fnr(fnr=fnr, d_numbers=d_numbers, h_numbers=h_numbers, today=today)
 
     individual_number = int(fnr[6:9])
     day, month, year = int(fnr[0:2]), int(fnr[2:4]), int(fnr[4:6])
-    if 41 <= day <= 71:  # if D-number
-        if not d_numbers:
-            raise ValueError('Fødselsnumber is a D-number (or day out of range)')
+    if day >= 41:  # if D-number
         day -= 40
+    if month >= 41:  # if H-number
+        month -= 40
 
-    if not (1 <= day <= 31):
-        raise ValueError('Day out of range in fødselsnumber')
+    return date(year=_birth_year(year, individual_number), month=month, day=day)
 
-    if 41 <= month <= 52:  # if H-number
-        if h_numbers:
-            month -= 40
-        else:
-            raise ValueError('Fødselsnumber is a H-number (or month out of range)')
-    if not 1 <= month <= 12:
-        raise ValueError('Month out of range in fødselsnumber')
+
+def _birth_year(year, individual_number):
+    """
+    Returns the four digit birth year from the two digit year and the individual number.
+
+    born 1854-1899: allocated from series 749-500
+    born 1900-1999: allocated from series 499-000
+    born 1940-1999: also allocated from series 999-900
+    born 2000-2039: allocated from series 999-500
+
+    Source: https://www.oecd.org/tax/automatic-exchange/crs-implementation-and-assistance/tax-identification-numbers/Norway-TIN.pdf
+    """
     if individual_number <= 499:  # individual numbers 000-499 indicate person is born in 19XX
         year += 1900
     else:
         year += 2000
     if individual_number >= 900 and year >= 2040:
         year -= 100
-
-    return date(year=year, month=month, day=day)
+    return year
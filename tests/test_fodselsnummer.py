@@ -42,6 +42,16 @@ class FodselsnummerTestCase(unittest.TestCase):
         valid_fnr = '04098049628'
         self.assertTrue(fodselsnummer.check_fnr(valid_fnr, d_numbers=False))
 
+    def test_valid_fnr_is_invalid_before_date_of_birth(self):
+        valid_fnr = '04098049628'
+        self.assertTrue(fodselsnummer.check_fnr(valid_fnr, today=datetime.date(1980, 9, 4)))
+        self.assertFalse(fodselsnummer.check_fnr(valid_fnr, today=datetime.date(1980, 9, 3)))
+
+    def test_check_a_batch_of_fnrs(self):
+        fnrs = ['04098049628', '01078018943', '41031883219', '80205870001', '04098049628garbage']
+        self.assertEqual(fodselsnummer.check_fnrs(fnrs), [True, False, True, False, False])
+        self.assertEqual(fodselsnummer.check_fnrs(fnrs, d_numbers=False), [True, False, False, False, False])
+
     def test_does_control_digits_match(self):
         """Does the control digit function work?"""
         incomplete_fnr = '311200136'
@@ -63,6 +73,19 @@ class FodselsnummerTestCase(unittest.TestCase):
         # last should be from december
         self.assertEqual(result[-1][0:6], '711285')
 
+    def test_iterate_over_a_year(self):
+        result = fodselsnummer.iter_fnr_for_year(1991, True)
+        self.assertEqual(next(result), fodselsnummer.generate_fnr_for_year(1991, True)[0])
+        self.assertEqual(list(fodselsnummer.iter_fnr_for_year(1991, False)), fodselsnummer.generate_fnr_for_year(1991, False))
+
+    def test_generate_for_a_year_as_bytes(self):
+        result = fodselsnummer.generate_fnr_for_year_bytes(1985, True)
+        expected = fodselsnummer.generate_fnr_for_year(1985, True)
+        self.assertEqual(len(result), 11 * len(expected))
+        self.assertEqual(result[0:11].decode(), expected[0])
+        self.assertEqual(result[-11:].decode(), expected[-1])
+        self.assertEqual(result, ''.join(expected).encode())
+
     # List are taken from: http://www.fnrinfo.no/Verktoy/FinnLovlige_Dato.aspx
 
     def test_1900s_sample_day(self):